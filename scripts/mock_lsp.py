@@ -3,12 +3,69 @@
 from __future__ import annotations
 
 import argparse
+import collections
 import json
+import os
+import re
+import sched
+import selectors
 import sys
 import threading
 import time
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
+
+try:
+  import orjson
+
+  def _dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj)
+
+  def _loads(data: bytes | memoryview) -> Any:
+    return orjson.loads(data)
+except ImportError:
+
+  def _dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+  def _loads(data: bytes | memoryview) -> Any:
+    if isinstance(data, memoryview):
+      data = data.tobytes()
+    return json.loads(data)
+
+
+_HAS_READV = hasattr(os, "readv")
+
+_HEADER_END = re.compile(rb"\r?\n\r?\n")
+# LSP method names never contain escapes, and request ids are numbers or
+# plain strings, so a shallow scan over the raw body is enough to peek them.
+_METHOD_RE = re.compile(rb'"method"\s*:\s*"([^"]+)"')
+_ID_RE = re.compile(rb'"id"\s*:\s*("(?:[^"\\]|\\.)*"|-?\d+)')
+
+# Hover progress notifications differ only by token; encode the frames once
+# and splice the token in per hover.
+_HOVER_BEGIN_TMPL = (
+  b'{"jsonrpc":"2.0","method":"$/progress","params":{"token":"%s",'
+  b'"value":{"kind":"begin","title":"hover","message":"mock hover started","percentage":0}}}'
+)
+_HOVER_END_TMPL = (
+  b'{"jsonrpc":"2.0","method":"$/progress","params":{"token":"%s",'
+  b'"value":{"kind":"end","message":"mock hover completed"}}}'
+)
+_HOVER_CANCELED_TMPL = (
+  b'{"jsonrpc":"2.0","method":"$/progress","params":{"token":"%s",'
+  b'"value":{"kind":"end","message":"mock hover canceled"}}}'
+)
+
+
+def _frame(encoded: bytes) -> bytearray:
+  # bytes %-formatting happens in C; one bytearray holds header + body so the
+  # writer hands a single contiguous buffer to write().
+  header = b"Content-Length: %d\r\n\r\n" % len(encoded)
+  buf = bytearray(len(header) + len(encoded))
+  buf[: len(header)] = header
+  buf[len(header) :] = encoded
+  return buf
 
 
 def parse_args() -> argparse.Namespace:
@@ -24,7 +81,12 @@ def parse_args() -> argparse.Namespace:
   parser.add_argument(
     "--log",
     default="/tmp/the-editor-mock-lsp.log",
-    help="JSONL log path for incoming/outgoing protocol messages.",
+    help='JSONL log path for incoming/outgoing protocol messages ("-", "" or /dev/null disables).',
+  )
+  parser.add_argument(
+    "--no-log",
+    action="store_true",
+    help="Disable protocol logging entirely.",
   )
   parser.add_argument(
     "--hover-delay",
@@ -49,36 +111,187 @@ def parse_args() -> argparse.Namespace:
 class MockLsp:
   def __init__(self, args: argparse.Namespace):
     self.args = args
-    self.log_path = Path(args.log)
-    self.log_path.parent.mkdir(parents=True, exist_ok=True)
-    self.log_file = self.log_path.open("a", encoding="utf-8", buffering=1)
+    self.log_enabled = not args.no_log and args.log not in ("", "-", "/dev/null")
+    if self.log_enabled:
+      self.log_path = Path(args.log)
+      self.log_path.parent.mkdir(parents=True, exist_ok=True)
+      self.log_file = self.log_path.open("ab", buffering=65536)
+      self.log_lock = threading.Lock()
+      self.log_flusher = threading.Thread(target=self._log_flush_loop, daemon=True)
+      self.log_flusher.start()
+    else:
+      # Rebinding the methods on the instance makes disabled logging free on
+      # the hot path — no per-call enabled check.
+      self.log = self._log_disabled
+      self.flush_log = self._noop
 
     self.stdout_lock = threading.Lock()
-    self.state_lock = threading.Lock()
-    self.cancelled_request_ids: set[int] = set()
+    self.stdin_fd = sys.stdin.buffer.fileno()
+    self.recv_buf = bytearray()
+    # Reused across reads so steady-state input does not allocate per chunk.
+    self.read_chunk = bytearray(1 << 16)
+    self.stdin_selector: selectors.BaseSelector | None = selectors.DefaultSelector()
+    try:
+      self.stdin_selector.register(self.stdin_fd, selectors.EVENT_READ)
+    except (OSError, PermissionError):
+      # Regular-file stdin cannot be polled with epoll; fall back to
+      # blocking reads.
+      self.stdin_selector.close()
+      self.stdin_selector = None
+    self.write_queue: collections.deque[bytes | bytearray] = collections.deque()
+    self.write_wakeup = threading.Event()
+    self.write_idle = threading.Event()
+    self.write_idle.set()
+    self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+    self.writer_thread.start()
+
+    # One long-lived thread services all delayed hover responses instead of
+    # spawning a thread per request.
+    self.scheduler = sched.scheduler(time.monotonic, time.sleep)
+    self.sched_wakeup = threading.Event()
+    self.scheduler_thread = threading.Thread(target=self._scheduler_loop, daemon=True)
+    self.scheduler_thread.start()
+    # (cancel_event, scheduler_handle, token) per in-flight hover;
+    # $/cancelRequest sets the event and unschedules the emit. Plain dict ops
+    # are atomic under the GIL, so no lock is needed on the cancel path.
+    self.pending_hovers: dict[int, tuple[threading.Event, sched.Event, str]] = {}
     self.exit_requested = False
     self.sent_startup_progress = False
     self.next_server_request_id = 9000
 
-  def log(self, direction: str, payload: Any, note: str | None = None) -> None:
-    entry: dict[str, Any] = {
-      "ts": time.time(),
-      "dir": direction,
-      "payload": payload,
+    # Constant response bodies, encoded once; send_raw_response splices the
+    # request id in at send time.
+    capabilities = {
+      "textDocumentSync": {
+        "openClose": True,
+        "change": 2,
+        "save": {"includeText": True},
+      },
+      "hoverProvider": True,
+      "definitionProvider": True,
+      "referencesProvider": True,
+      "documentSymbolProvider": True,
+      "workspaceSymbolProvider": True,
+      "completionProvider": {},
+      "signatureHelpProvider": {},
+      "codeActionProvider": True,
+      "renameProvider": True,
+      "documentFormattingProvider": True,
+    }
+    self.init_result_bytes = _dumps(
+      {
+        "capabilities": capabilities,
+        "serverInfo": {"name": "the-editor-mock-lsp", "version": "0.1.0"},
+      }
+    )
+    self.hover_result_bytes = _dumps(
+      {
+        "contents": {
+          "kind": "markdown",
+          "value": "Mock hover documentation from `mock_lsp.py`.",
+        }
+      }
+    )
+    self.empty_list_bytes = b"[]"
+
+    # Methods whose response is a pre-encoded constant; read_message answers
+    # these straight from the raw body without a full JSON parse.
+    self.fast_responses: dict[bytes, bytes] = {
+      b"textDocument/references": self.empty_list_bytes,
+      b"textDocument/documentSymbol": self.empty_list_bytes,
+      b"workspace/symbol": self.empty_list_bytes,
+      b"shutdown": b"null",
     }
-    if note is not None:
-      entry["note"] = note
-    self.log_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
 
-  def read_message(self) -> dict[str, Any] | None:
-    content_length: int | None = None
+    self.request_handlers: dict[str, Callable[[Any, Any], None]] = {
+      "initialize": self._on_initialize,
+      "shutdown": self._on_shutdown,
+      "textDocument/definition": self._on_definition,
+      "textDocument/references": self._on_empty_list_request,
+      "textDocument/documentSymbol": self._on_empty_list_request,
+      "workspace/symbol": self._on_empty_list_request,
+      "textDocument/hover": self._on_hover,
+    }
+    self.notification_handlers: dict[str, Callable[[Any], None]] = {
+      "$/cancelRequest": self._on_cancel_request,
+      "initialized": self._on_initialized,
+      "exit": self._on_exit,
+    }
+
+  def log(
+    self,
+    direction: str,
+    payload: Any,
+    note: str | None = None,
+    encoded: bytes | memoryview | None = None,
+  ) -> None:
+    # `encoded` is the payload already serialized (e.g. the wire bytes from
+    # `send`); splicing it into the log line avoids serializing twice.
+    if encoded is None:
+      encoded = _dumps(payload)
+    parts = [b'{"ts":', b"%.6f" % time.time(), b',"dir":"', direction.encode("ascii"), b'"']
+    if note is not None:
+      parts += [b',"note":', _dumps(note)]
+    parts += [b',"payload":', encoded, b"}\n"]
+    with self.log_lock:
+      self.log_file.write(b"".join(parts))
+
+  def _log_flush_loop(self) -> None:
+    # Logs go through a 64KB buffer instead of a flush per entry; this keeps
+    # the file fresh enough for a harness tailing it mid-test.
     while True:
-      header_line = sys.stdin.buffer.readline()
-      if header_line == b"":
-        return None
-      if header_line in (b"\r\n", b"\n"):
+      time.sleep(0.1)
+      self.flush_log()
+
+  def flush_log(self) -> None:
+    with self.log_lock:
+      self.log_file.flush()
+
+  def _log_disabled(
+    self,
+    direction: str,
+    payload: Any,
+    note: str | None = None,
+    encoded: bytes | memoryview | None = None,
+  ) -> None:
+    return None
+
+  def _noop(self) -> None:
+    return None
+
+  def _fill_recv_buf(self) -> bool:
+    # Poll with a timeout so exit_requested (set by the `exit` notification
+    # handler or a future signal path) wakes the read loop promptly instead
+    # of leaving it parked in a blocking read.
+    while not self.exit_requested:
+      if self.stdin_selector is not None and not self.stdin_selector.select(timeout=0.5):
+        continue
+      if _HAS_READV:
+        n = os.readv(self.stdin_fd, [self.read_chunk])
+        if n == 0:
+          return False
+        self.recv_buf += memoryview(self.read_chunk)[:n]
+      else:
+        chunk = os.read(self.stdin_fd, 1 << 16)
+        if not chunk:
+          return False
+        self.recv_buf += chunk
+      return True
+    return False
+
+  def _read_frame(self) -> tuple[int, int] | None:
+    # Read in 64KB chunks into recv_buf and carve frames out of it, instead
+    # of paying a readline() call per header line.
+    while True:
+      match = _HEADER_END.search(self.recv_buf)
+      if match is not None:
         break
-      decoded = header_line.decode("utf-8", errors="replace").strip()
+      if not self._fill_recv_buf():
+        return None
+
+    content_length: int | None = None
+    for line in bytes(self.recv_buf[: match.start()]).split(b"\n"):
+      decoded = line.decode("utf-8", errors="replace").strip()
       if decoded.lower().startswith("content-length:"):
         _, value = decoded.split(":", 1)
         content_length = int(value.strip())
@@ -86,21 +299,88 @@ class MockLsp:
     if content_length is None:
       raise ValueError("missing Content-Length header")
 
-    body = sys.stdin.buffer.read(content_length)
-    if len(body) < content_length:
-      return None
-    message = json.loads(body.decode("utf-8"))
-    self.log("in", message)
-    return message
+    body_end = match.end() + content_length
+    while len(self.recv_buf) < body_end:
+      if not self._fill_recv_buf():
+        return None
+
+    return match.end(), body_end
+
+  def read_message(self) -> dict[str, Any] | None:
+    while True:
+      span = self._read_frame()
+      if span is None:
+        return None
+      body_start, body_end = span
+      # A memoryview slice into recv_buf; everything downstream (regex peek,
+      # log join, orjson) accepts it directly, so the body is never copied
+      # out of the receive buffer. The view must be released before the
+      # buffer is trimmed.
+      body = memoryview(self.recv_buf)[body_start:body_end]
+      try:
+        self.log("in", None, encoded=body)
+
+        # Requests we answer with a pre-encoded constant only need the method
+        # and id peeked out of the raw bytes; skip deserializing the rest.
+        match = _METHOD_RE.search(body)
+        if match is not None:
+          result_bytes = self.fast_responses.get(match.group(1))
+          if result_bytes is not None:
+            id_match = _ID_RE.search(body)
+            if id_match is not None:
+              self._send_raw_response_id(id_match.group(1), result_bytes)
+              continue
+
+        return _loads(body)
+      finally:
+        body.release()
+        del self.recv_buf[:body_end]
+
+  def _writer_loop(self) -> None:
+    # Single consumer of write_queue: drain everything that is ready, write it
+    # out in one batch, then sleep until send() wakes us again.
+    fd = sys.stdout.buffer.fileno()
+    use_writev = hasattr(os, "writev")
+    while True:
+      self.write_wakeup.wait()
+      self.write_wakeup.clear()
+      buffers: list[bytes | bytearray | memoryview] = []
+      while True:
+        try:
+          buffers.append(self.write_queue.popleft())
+        except IndexError:
+          break
+      if buffers:
+        with self.stdout_lock:
+          if use_writev:
+            while buffers:
+              written = os.writev(fd, buffers)
+              while buffers and written >= len(buffers[0]):
+                written -= len(buffers[0])
+                buffers.pop(0)
+              if buffers and written:
+                buffers[0] = memoryview(buffers[0])[written:]
+          else:
+            sys.stdout.buffer.write(b"".join(buffers))
+            sys.stdout.buffer.flush()
+      if not self.write_queue:
+        self.write_idle.set()
+
+  def _enqueue_write(self, *buffers: bytes | bytearray) -> None:
+    self.write_idle.clear()
+    self.write_queue.extend(buffers)
+    self.write_wakeup.set()
+
+  def drain_writes(self, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+      if self.write_idle.wait(0.05) and not self.write_queue:
+        return
 
   def send(self, message: dict[str, Any], *, note: str | None = None) -> None:
-    encoded = json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
-    header = f"Content-Length: {len(encoded)}\r\n\r\n".encode("ascii")
-    with self.stdout_lock:
-      sys.stdout.buffer.write(header)
-      sys.stdout.buffer.write(encoded)
-      sys.stdout.buffer.flush()
-    self.log("out", message, note=note)
+    encoded = _dumps(message)
+    self._enqueue_write(_frame(encoded))
+    self.log("out", None, note=note, encoded=encoded)
 
   def send_response(self, request_id: Any, result: Any = None, error: Any = None) -> None:
     response: dict[str, Any] = {
@@ -113,6 +393,30 @@ class MockLsp:
       response["error"] = error
     self.send(response)
 
+  def send_raw_response(self, request_id: Any, result_bytes: bytes, *, note: str | None = None) -> None:
+    self._send_raw_response_id(_dumps(request_id), result_bytes, note=note)
+
+  def _send_raw_response_id(self, id_bytes: bytes, result_bytes: bytes, *, note: str | None = None) -> None:
+    encoded = b'{"jsonrpc":"2.0","id":' + id_bytes + b',"result":' + result_bytes + b"}"
+    self._send_raw(encoded, note=note)
+
+  def _send_raw(self, encoded: bytes, *, note: str | None = None) -> None:
+    self._enqueue_write(_frame(encoded))
+    self.log("out", None, note=note, encoded=encoded)
+
+  def send_many(self, messages: list[dict[str, Any]], notes: list[str | None] | None = None) -> None:
+    self._send_raw_many([_dumps(message) for message in messages], notes)
+
+  def _send_raw_many(self, encoded_bodies: list[bytes], notes: list[str | None] | None = None) -> None:
+    # One queue entry for the whole burst, so the writer emits it with a
+    # single write and the client sees the messages back to back.
+    frames = bytearray()
+    for encoded in encoded_bodies:
+      frames += _frame(encoded)
+    self._enqueue_write(frames)
+    for index, encoded in enumerate(encoded_bodies):
+      self.log("out", None, note=notes[index] if notes else None, encoded=encoded)
+
   def send_notification(self, method: str, params: Any | None = None) -> None:
     notification: dict[str, Any] = {
       "jsonrpc": "2.0",
@@ -136,142 +440,79 @@ class MockLsp:
     return request_id
 
   def handle_request(self, message: dict[str, Any]) -> None:
-    method = str(message.get("method"))
-    request_id = message.get("id")
-    params = message.get("params")
-
-    if method == "initialize":
-      if self.args.mode == "crash-init":
-        self.log("meta", {"mode": self.args.mode}, note="exiting on initialize")
-        sys.exit(1)
-      if self.args.mode == "ignore-init":
-        self.log("meta", {"mode": self.args.mode}, note="ignoring initialize")
-        return
-
-      capabilities = {
-        "textDocumentSync": {
-          "openClose": True,
-          "change": 2,
-          "save": {"includeText": True},
-        },
-        "hoverProvider": True,
-        "definitionProvider": True,
-        "referencesProvider": True,
-        "documentSymbolProvider": True,
-        "workspaceSymbolProvider": True,
-        "completionProvider": {},
-        "signatureHelpProvider": {},
-        "codeActionProvider": True,
-        "renameProvider": True,
-        "documentFormattingProvider": True,
-      }
-      self.send_response(
-        request_id,
-        result={
-          "capabilities": capabilities,
-          "serverInfo": {"name": "the-editor-mock-lsp", "version": "0.1.0"},
-        },
-      )
+    method = message.get("method")
+    if not isinstance(method, str):
+      self._on_unknown_request(message.get("id"), message.get("params"))
       return
-
-    if method == "shutdown":
-      self.send_response(request_id, result=None)
+    handler = self.request_handlers.get(method, self._on_unknown_request)
+    handler(message.get("id"), message.get("params"))
+
+  def _on_initialize(self, request_id: Any, params: Any) -> None:
+    if self.args.mode == "crash-init":
+      self.log("meta", {"mode": self.args.mode}, note="exiting on initialize")
+      sys.exit(1)
+    if self.args.mode == "ignore-init":
+      self.log("meta", {"mode": self.args.mode}, note="ignoring initialize")
       return
+    self.send_raw_response(request_id, self.init_result_bytes)
 
-    if method == "textDocument/definition":
-      uri = None
-      if isinstance(params, dict):
-        uri = params.get("textDocument", {}).get("uri")
-      self.send_response(
-        request_id,
-        result=[
-          {
-            "uri": uri or "file:///tmp/mock.rs",
-            "range": {
-              "start": {"line": 0, "character": 0},
-              "end": {"line": 0, "character": 5},
-            },
-          }
-        ],
-      )
-      return
-
-    if method == "textDocument/references":
-      self.send_response(request_id, result=[])
-      return
+  def _on_shutdown(self, request_id: Any, params: Any) -> None:
+    self.send_response(request_id, result=None)
 
-    if method == "textDocument/documentSymbol":
-      self.send_response(request_id, result=[])
-      return
+  def _on_definition(self, request_id: Any, params: Any) -> None:
+    uri = None
+    if isinstance(params, dict):
+      uri = params.get("textDocument", {}).get("uri")
+    self.send_response(
+      request_id,
+      result=[
+        {
+          "uri": uri or "file:///tmp/mock.rs",
+          "range": {
+            "start": {"line": 0, "character": 0},
+            "end": {"line": 0, "character": 5},
+          },
+        }
+      ],
+    )
 
-    if method == "workspace/symbol":
-      self.send_response(request_id, result=[])
-      return
+  def _on_empty_list_request(self, request_id: Any, params: Any) -> None:
+    self.send_raw_response(request_id, self.empty_list_bytes)
 
-    if method == "textDocument/hover":
-      delay = self.args.timeout_delay if self.args.mode == "timeout" else self.args.hover_delay
-      self.schedule_hover_response(request_id, delay)
-      return
+  def _on_hover(self, request_id: Any, params: Any) -> None:
+    delay = self.args.timeout_delay if self.args.mode == "timeout" else self.args.hover_delay
+    self.schedule_hover_response(request_id, delay)
 
+  def _on_unknown_request(self, request_id: Any, params: Any) -> None:
     self.send_response(request_id, result=None)
 
   def schedule_hover_response(self, request_id: Any, delay: float) -> None:
     token = f"hover-{request_id}"
-    self.send_notification(
-      "$/progress",
-      {
-        "token": token,
-        "value": {
-          "kind": "begin",
-          "title": "hover",
-          "message": "mock hover started",
-          "percentage": 0,
-        },
-      },
-    )
+    self._send_raw(_HOVER_BEGIN_TMPL % token.encode("utf-8"))
 
-    def worker() -> None:
-      time.sleep(delay)
-      canceled = False
-      if isinstance(request_id, int):
-        with self.state_lock:
-          canceled = request_id in self.cancelled_request_ids
-
-      if canceled:
-        self.log("meta", {"id": request_id}, note="hover canceled")
-        self.send_notification(
-          "$/progress",
-          {
-            "token": token,
-            "value": {
-              "kind": "end",
-              "message": "mock hover canceled",
-            },
-          },
-        )
-        return
+    cancel_event = threading.Event()
+    handle = self.scheduler.enter(delay, 1, self._emit_hover, (request_id, token, cancel_event))
+    if isinstance(request_id, int):
+      self.pending_hovers[request_id] = (cancel_event, handle, token)
+    self.sched_wakeup.set()
 
-      self.send_response(
-        request_id,
-        result={
-          "contents": {
-            "kind": "markdown",
-            "value": "Mock hover documentation from `mock_lsp.py`.",
-          }
-        },
-      )
-      self.send_notification(
-        "$/progress",
-        {
-          "token": token,
-          "value": {
-            "kind": "end",
-            "message": "mock hover completed",
-          },
-        },
-      )
+  def _scheduler_loop(self) -> None:
+    while True:
+      self.sched_wakeup.wait()
+      self.sched_wakeup.clear()
+      self.scheduler.run()
 
-    threading.Thread(target=worker, daemon=True).start()
+  def _emit_hover(self, request_id: Any, token: str, cancel_event: threading.Event) -> None:
+    if isinstance(request_id, int):
+      self.pending_hovers.pop(request_id, None)
+
+    if cancel_event.is_set():
+      self.log("meta", {"id": request_id}, note="hover canceled")
+      self._send_raw(_HOVER_CANCELED_TMPL % token.encode("utf-8"))
+      return
+
+    response = b'{"jsonrpc":"2.0","id":' + _dumps(request_id) + b',"result":' + self.hover_result_bytes + b"}"
+    self._send_raw_many([response, _HOVER_END_TMPL % token.encode("utf-8")])
 
   def maybe_emit_startup_progress(self) -> None:
     if self.sent_startup_progress or not self.args.startup_progress:
@@ -279,50 +520,68 @@ class MockLsp:
     self.sent_startup_progress = True
     token = "startup-index"
     self.send_server_request("window/workDoneProgress/create", {"token": token})
-    self.send_notification(
-      "$/progress",
-      {
-        "token": token,
-        "value": {
-          "kind": "begin",
-          "title": "startup",
-          "message": "mock indexing started",
-          "percentage": 5,
+    self.send_many(
+      [
+        {
+          "jsonrpc": "2.0",
+          "method": "$/progress",
+          "params": {
+            "token": token,
+            "value": {
+              "kind": "begin",
+              "title": "startup",
+              "message": "mock indexing started",
+              "percentage": 5,
+            },
+          },
         },
-      },
-    )
-    self.send_notification(
-      "$/progress",
-      {
-        "token": token,
-        "value": {
-          "kind": "end",
-          "message": "mock indexing complete",
+        {
+          "jsonrpc": "2.0",
+          "method": "$/progress",
+          "params": {
+            "token": token,
+            "value": {
+              "kind": "end",
+              "message": "mock indexing complete",
+            },
+          },
         },
-      },
+      ]
     )
 
   def handle_notification(self, message: dict[str, Any]) -> None:
-    method = str(message.get("method"))
-    params = message.get("params")
-
-    if method == "$/cancelRequest":
-      request_id = None
-      if isinstance(params, dict):
-        request_id = params.get("id")
-      if isinstance(request_id, int):
-        with self.state_lock:
-          self.cancelled_request_ids.add(request_id)
-        self.log("meta", {"id": request_id}, note="received cancel request")
+    method = message.get("method")
+    if not isinstance(method, str):
       return
+    handler = self.notification_handlers.get(method)
+    if handler is not None:
+      handler(message.get("params"))
+
+  def _on_cancel_request(self, params: Any) -> None:
+    request_id = None
+    if isinstance(params, dict):
+      request_id = params.get("id")
+    if isinstance(request_id, int):
+      self.log("meta", {"id": request_id}, note="received cancel request")
+      entry = self.pending_hovers.pop(request_id, None)
+      if entry is None:
+        return
+      cancel_event, handle, token = entry
+      cancel_event.set()
+      try:
+        self.scheduler.cancel(handle)
+      except ValueError:
+        # Already being emitted; _emit_hover sees the event and answers with
+        # the canceled end-progress itself.
+        return
+      self.log("meta", {"id": request_id}, note="hover canceled")
+      self._send_raw(_HOVER_CANCELED_TMPL % token.encode("utf-8"))
 
-    if method == "initialized":
-      self.maybe_emit_startup_progress()
-      return
+  def _on_initialized(self, params: Any) -> None:
+    self.maybe_emit_startup_progress()
 
-    if method == "exit":
-      self.exit_requested = True
-      return
+  def _on_exit(self, params: Any) -> None:
+    self.exit_requested = True
 
   def run(self) -> int:
     try:
@@ -347,6 +606,9 @@ class MockLsp:
     except Exception as exc:  # pragma: no cover
       self.log("error", {"error": str(exc)})
       return 1
+    finally:
+      self.drain_writes()
+      self.flush_log()
     return 0
 
 